@@ -1,17 +1,28 @@
 #!/opt/conda/envs/deep-classification/bin/python
 
 # preprocess.py
-#     Convert point cloud with normal in TXT into tfrecords
+#     Convert point cloud with normal in TXT into tfrecords or memory-mapped arrays
 
 import argparse
 import glob
 import os
+import warnings
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from itertools import repeat
 
-import random
 import numpy as np
-import pandas as pd
 from sklearn.model_selection import StratifiedShuffleSplit
 import tensorflow as tf
+from google.protobuf.internal import api_implementation
+
+try:
+    import pyarrow as pa
+    from pyarrow import csv as pacsv
+except ImportError:
+    # fall back to numpy parser:
+    pa = None
 
 import progressbar
 
@@ -38,6 +49,14 @@ class ModelNet40Dataset:
     d = 3
     C = 3
 
+    COLUMNS = ['x', 'y', 'z', 'nx', 'ny', 'nz']
+
+    # full scale of int16 quantization:
+    Q = 32767
+
+    # TFRecord writer output buffer, in bytes:
+    WRITE_BUFFER_SIZE = 4 << 20
+
     def __init__(
         self, 
         input_dir,
@@ -56,22 +75,22 @@ class ModelNet40Dataset:
         self.__train = np.asarray(
             self.__load_examples(filename_train)
         )
+        train_label_ids = self.__get_label_ids(self.__train)
         # create validation set:
         sss = StratifiedShuffleSplit(n_splits=1, test_size=size_validate, random_state=random_seed)
         for fit_index, validate_index in sss.split(            
             self.__train, 
             # labels:
-            [t.split('_')[0] for t in self.__train]
+            train_label_ids
         ):
             self.__fit, self.__validate = self.__train[fit_index], self.__train[validate_index]
-        # load test set:
-        self.__test = self.__load_examples(filename_test)
-
-        # remove orders:
-        random.seed(random_seed)
-        random.shuffle(self.__fit)
-        random.shuffle(self.__validate)
-        random.shuffle(self.__test)
+            self.__fit_label_ids, self.__validate_label_ids = train_label_ids[fit_index], train_label_ids[validate_index]
+        # load test set. no shuffle needed here--StratifiedShuffleSplit already randomizes fit & validate,
+        # and TFRecords are reshuffled when loaded:
+        self.__test = np.asarray(
+            self.__load_examples(filename_test)
+        )
+        self.__test_label_ids = self.__get_label_ids(self.__test)
 
     def __load_labels(self, filename_labels):
         """ 
@@ -86,7 +105,7 @@ class ModelNet40Dataset:
         (labels, encoder, decoder) = (None, None, None)
 
         with open(os.path.join(self.__input_dir, filename_labels)) as f:
-            labels = [l.strip() for l in f.readlines()]
+            labels = f.read().splitlines()
 
         encoder = {label: id for id, label in enumerate(labels)}
         decoder = {id: label for id, label in enumerate(labels)}
@@ -106,74 +125,385 @@ class ModelNet40Dataset:
         examples = None
 
         with open(os.path.join(self.__input_dir, filename_split)) as f:
-            examples = [e.strip() for e in f.readlines()]
+            examples = f.read().splitlines()
 
         return examples
 
-    def __get_label(self, filename_example):
+    def __get_label_ids(self, filename_examples):
         """ 
-        Get label of example
+        Get label IDs of examples in one vectorized pass
 
         Parameters
         ----------
-        filename_example: str 
-            Short filename of example.
+        filename_examples: numpy.ndarray 
+            Short filenames of examples.
 
         """
-        label, _ = filename_example.rsplit('_', 1)
+        labels = np.char.rpartition(filename_examples, '_')[:, 0]
+        # only encode each distinct label once:
+        unique_labels, inverse = np.unique(labels, return_inverse=True)
+        unique_label_ids = np.asarray(
+            [self.__encoder[label] for label in unique_labels], dtype=np.int64
+        )
 
-        return label
+        return unique_label_ids[inverse]
 
-    def __get_filename_point_cloud(self, filename_example):
+    def __get_filenames_point_cloud(self, filename_examples):
         """ 
-        Get relative path of example
+        Get full paths of examples in one vectorized pass
 
         Parameters
         ----------
-        filename_example: str 
-            Short filename of example.
+        filename_examples: numpy.ndarray 
+            Short filenames of examples.
 
         """
-        # get label:
-        label = self.__get_label(filename_example)
+        # get labels:
+        labels = np.char.rpartition(filename_examples, '_')[:, 0]
         
-        # generate relative filename:
-        filename_point_cloud = os.path.join(
-            self.__input_dir, label, filename_example
+        # generate full filename as <input_dir>/<label>/<example>.txt:
+        filenames_point_cloud = np.char.add(
+            np.char.add(os.path.join(self.__input_dir, ''), labels),
+            np.char.add(os.sep, filename_examples)
         )
-        filename_point_cloud = f'{filename_point_cloud}.txt'
+        filenames_point_cloud = np.char.add(filenames_point_cloud, '.txt')
 
-        return filename_point_cloud
+        return filenames_point_cloud
 
-    def __write(self, filename_examples, filename_tfrecord):
+    @staticmethod
+    def __read_point_cloud(filename_point_cloud):
         """ 
-        Save split to TFRecord
+        Parse point cloud with normal in TXT
+
+        Parameters
+        ----------
+        filename_point_cloud: str 
+            Full filename of point cloud TXT.
+
+        """
+        if pa is None:
+            # the TXT is strictly comma separated floats, one point per line. 
+            # turn it into one flat list & let numpy's C tokenizer parse it in a single pass:
+            with open(filename_point_cloud, 'rb') as f:
+                # no trailing separator, so well-formed files never trip the malformed input check below:
+                data = f.read().rstrip().replace(b'\n', b',')
+
+            with warnings.catch_warnings():
+                # older numpy only warns on malformed input & returns the values parsed so far:
+                warnings.simplefilter('error', DeprecationWarning)
+                try:
+                    values = np.fromstring(
+                        data, 
+                        dtype=np.float32, sep=','
+                    )
+                except (DeprecationWarning, ValueError) as e:
+                    raise ValueError(
+                        f'[ModelNet40 Dataset (With Normal)] ERROR--malformed point cloud {filename_point_cloud}: {e}'
+                    ) from e
+
+            if values.size == 0 or values.size % len(ModelNet40Dataset.COLUMNS) != 0:
+                raise ValueError(
+                    f'[ModelNet40 Dataset (With Normal)] ERROR--malformed point cloud {filename_point_cloud}: '
+                    f'{values.size} values is not a whole number of {len(ModelNet40Dataset.COLUMNS)}-column rows'
+                )
+
+            return values.reshape(-1, len(ModelNet40Dataset.COLUMNS))
+
+        table = pacsv.read_csv(
+            filename_point_cloud,
+            read_options=pacsv.ReadOptions(
+                # parallelism comes from the worker processes:
+                column_names=ModelNet40Dataset.COLUMNS, use_threads=False
+            ),
+            parse_options=pacsv.ParseOptions(delimiter=','),
+            convert_options=pacsv.ConvertOptions(
+                column_types={c: pa.float32() for c in ModelNet40Dataset.COLUMNS}
+            )
+        )
+
+        return np.stack(
+            [table.column(c).to_numpy() for c in ModelNet40Dataset.COLUMNS], 
+            axis=1
+        )
+
+    @staticmethod
+    def __get_filename_npy(filename_point_cloud):
+        """ 
+        Get filename of the .npy cache of point cloud
+
+        Parameters
+        ----------
+        filename_point_cloud: str 
+            Full filename of point cloud TXT.
+
+        """
+        return f'{os.path.splitext(filename_point_cloud)[0]}.npy'
+
+    @staticmethod
+    def __is_cached(filename_point_cloud):
+        """ 
+        Check whether point cloud has a .npy cache at least as new as its TXT
+
+        Parameters
+        ----------
+        filename_point_cloud: str 
+            Full filename of point cloud TXT.
+
+        """
+        filename_npy = ModelNet40Dataset.__get_filename_npy(filename_point_cloud)
+
+        return (
+            os.path.isfile(filename_npy) and 
+            os.path.getmtime(filename_npy) >= os.path.getmtime(filename_point_cloud)
+        )
+
+    @staticmethod
+    def __prefetch(filenames_point_cloud, cache):
+        """ 
+        Ask the kernel to start reading each point cloud as it is queued, 
+        so file I/O overlaps with the parsing of earlier examples
+
+        Parameters
+        ----------
+        filenames_point_cloud: iterable 
+            Full filenames of point cloud TXT.
+        cache: bool
+            Whether workers read through the .npy cache.
+
+        """
+        for filename_point_cloud in filenames_point_cloud:
+            # the worker will read the .npy cache when present & up to date:
+            if cache and ModelNet40Dataset.__is_cached(filename_point_cloud):
+                filename = ModelNet40Dataset.__get_filename_npy(filename_point_cloud)
+            else:
+                filename = filename_point_cloud
+
+            fd = os.open(filename, os.O_RDONLY)
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+            finally:
+                os.close(fd)
+
+            yield filename_point_cloud
+
+    @staticmethod
+    def __cache_npy(filename_point_cloud):
+        """ 
+        Load point cloud from its .npy sibling, (re-)creating it on first access 
+        or when the TXT has been modified since
+
+        Parameters
+        ----------
+        filename_point_cloud: str 
+            Full filename of point cloud TXT.
+
+        """
+        filename_npy = ModelNet40Dataset.__get_filename_npy(filename_point_cloud)
+
+        if ModelNet40Dataset.__is_cached(filename_point_cloud):
+            return np.load(filename_npy, mmap_mode='r')
+
+        point_cloud_with_normal = ModelNet40Dataset.__read_point_cloud(filename_point_cloud)
+
+        # write to a temporary name & rename, so an interrupted save never leaves a truncated cache behind:
+        filename_tmp = f'{filename_npy}.{os.getpid()}.tmp'
+        try:
+            with open(filename_tmp, 'wb') as f:
+                np.save(f, point_cloud_with_normal)
+            os.replace(filename_tmp, filename_npy)
+        except OSError:
+            # read-only dataset directory, full disk etc--go on without the cache:
+            if os.path.isfile(filename_tmp):
+                os.remove(filename_tmp)
+
+        return point_cloud_with_normal
+
+    @staticmethod
+    def load(filename_point_cloud, cache=True):
+        """ 
+        Parse one example as N-by-(d + C) array. Runs inside worker processes
+
+        Parameters
+        ----------
+        filename_point_cloud: str 
+            Full filename of point cloud TXT.
+        cache: bool
+            Read through (and maintain) the .npy cache next to the TXT. Defaults to True.
+
+        """
+        if cache:
+            point_cloud_with_normal = ModelNet40Dataset.__cache_npy(filename_point_cloud)
+        else:
+            point_cloud_with_normal = ModelNet40Dataset.__read_point_cloud(filename_point_cloud)
+
+        # every record holds exactly N points--resample cyclically if the file has a different count:
+        num_points, _ = point_cloud_with_normal.shape
+        if num_points != ModelNet40Dataset.N:
+            print(
+                f'[ModelNet40 Dataset (With Normal)]: WARNING--{filename_point_cloud} has {num_points} points, '
+                f'resampled cyclically to {ModelNet40Dataset.N}.'
+            )
+            point_cloud_with_normal = point_cloud_with_normal[
+                np.arange(ModelNet40Dataset.N) % num_points
+            ]
+
+        return np.asarray(point_cloud_with_normal, dtype=np.float32)
+
+    @staticmethod
+    def process(filename_point_cloud, label_id, cache=True):
+        """ 
+        Parse and serialize one example. Runs inside worker processes
+
+        Parameters
+        ----------
+        filename_point_cloud: str 
+            Full filename of point cloud TXT.
+        label_id: int 
+            Shape ID.
+        cache: bool
+            Read through (and maintain) the .npy cache next to the TXT. Defaults to True.
+
+        """
+        point_cloud_with_normal = ModelNet40Dataset.load(filename_point_cloud, cache)
+
+        return ModelNet40Dataset.serialize(point_cloud_with_normal, label_id)
+
+    @staticmethod
+    def __imap(executor, fn, *iterables, max_pending):
+        """ 
+        Ordered executor map with at most max_pending tasks in flight
+
+        Parameters
+        ----------
+        executor: concurrent.futures.Executor 
+            Executor running the tasks.
+        fn: callable
+            Task function.
+        iterables: iterable
+            Task arguments.
+        max_pending: int
+            Maximum number of submitted but not yet consumed tasks.
+
+        """
+        pending = deque()
+
+        for args in zip(*iterables):
+            pending.append(executor.submit(fn, *args))
+            # block on the oldest task only once the window is full:
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+
+    def __write(self, filename_examples, label_ids, filename_tfrecord, num_shards, compression_type, num_workers, cache):
+        """ 
+        Save split to TFRecord shards
 
         Parameters
         ----------
         filename_examples: str 
             Filenames of split examples.
+        label_ids: numpy.ndarray 
+            Label IDs of split examples.
         filename_tfrecord: str 
-            Filename of output TFRecord.
+            Filename prefix of output TFRecord shards.
+        num_shards: int
+            Number of output TFRecord shards.
+        compression_type: str
+            TFRecord compression, one of '', 'ZLIB' or 'GZIP'. Applied at zlib level 1.
+        num_workers: int
+            Number of worker processes. Defaults to CPU count when None.
+        cache: bool
+            Read through (and maintain) the .npy cache next to each TXT.
 
         """
-        with tf.io.TFRecordWriter(filename_tfrecord) as writer:
-            for filename_example in progressbar.progressbar(filename_examples):
-                # parse point cloud:
-                filename_point_cloud = self.__get_filename_point_cloud(filename_example)
-                df_point_cloud_with_normal = pd.read_csv(
-                    filename_point_cloud, 
-                    header=None, names=['x', 'y', 'z', 'nx', 'ny', 'nz']
-                )
-                # get label:
-                label = self.__get_label(filename_example)
-                # format:
-                xyz = df_point_cloud_with_normal[['x', 'y', 'z']].values.astype(np.float32)
-                points = df_point_cloud_with_normal[['nx', 'ny', 'nz']].values.astype(np.float32)
-                label_id = self.__encoder[label]
-                # write to tfrecord:
-                serialized_example = ModelNet40Dataset.serialize(xyz, points, label_id)
-                writer.write(serialized_example)
+        num_workers = num_workers or os.cpu_count()
+        filenames_point_cloud = self.__get_filenames_point_cloud(filename_examples)
+        # readahead hints are POSIX only:
+        if hasattr(os, 'posix_fadvise'):
+            filenames_point_cloud = ModelNet40Dataset.__prefetch(filenames_point_cloud, cache)
+
+        # remove shards of earlier runs, so a changed shard count or compression never leaves
+        # stale files behind for the <name>_<split>-*.tfrecord pattern to pick up:
+        for filename_stale in glob.glob(f'{glob.escape(filename_tfrecord)}-*-of-*.tfrecord'):
+            os.remove(filename_stale)
+
+        with ProcessPoolExecutor(max_workers=num_workers) as executor, ExitStack() as stack:
+            writers = [
+                stack.enter_context(
+                    tf.io.TFRecordWriter(
+                        f'{filename_tfrecord}-{i:05d}-of-{num_shards:05d}.tfrecord',
+                        # compression runs on this single consumer thread--keep it light. 
+                        # a 4MB output buffer makes the compressed stream reach disk in large writes 
+                        # instead of one small write per record:
+                        options=tf.io.TFRecordOptions(
+                            compression_type=compression_type, compression_level=1,
+                            output_buffer_size=ModelNet40Dataset.WRITE_BUFFER_SIZE
+                        )
+                    )
+                ) for i in range(num_shards)
+            ]
+            # workers keep parsing the next examples while results are written, 
+            # and the bounded window caps the serialized examples held in memory:
+            serialized_examples = ModelNet40Dataset.__imap(
+                executor, ModelNet40Dataset.process, 
+                filenames_point_cloud, label_ids, repeat(cache),
+                max_pending=4 * num_workers
+            )
+            # write to tfrecord, striping examples across shards:
+            for i, serialized_example in enumerate(
+                progressbar.progressbar(serialized_examples, max_value=len(label_ids))
+            ):
+                writers[i % num_shards].write(serialized_example)
+
+    def __write_memmap(self, filename_examples, label_ids, filename_memmap, num_workers, cache):
+        """ 
+        Save split as one dense memory-mapped array
+
+        Parameters
+        ----------
+        filename_examples: str 
+            Filenames of split examples.
+        label_ids: numpy.ndarray 
+            Label IDs of split examples.
+        filename_memmap: str 
+            Filename prefix of output .dat / .lbl files.
+        num_workers: int
+            Number of worker processes. Defaults to CPU count when None.
+        cache: bool
+            Read through (and maintain) the .npy cache next to each TXT.
+
+        """
+        num_workers = num_workers or os.cpu_count()
+        filenames_point_cloud = self.__get_filenames_point_cloud(filename_examples)
+        # readahead hints are POSIX only:
+        if hasattr(os, 'posix_fadvise'):
+            filenames_point_cloud = ModelNet40Dataset.__prefetch(filenames_point_cloud, cache)
+
+        features = np.memmap(
+            f'{filename_memmap}.dat', dtype=np.float32, mode='w+', 
+            shape=(len(label_ids), ModelNet40Dataset.N, ModelNet40Dataset.d + ModelNet40Dataset.C)
+        )
+        labels = np.memmap(
+            f'{filename_memmap}.lbl', dtype=np.int64, mode='w+', 
+            shape=(len(label_ids), )
+        )
+        labels[:] = label_ids
+
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            point_clouds = ModelNet40Dataset.__imap(
+                executor, ModelNet40Dataset.load, 
+                filenames_point_cloud, repeat(cache),
+                max_pending=4 * num_workers
+            )
+            for i, point_cloud_with_normal in enumerate(
+                progressbar.progressbar(point_clouds, max_value=len(label_ids))
+            ):
+                features[i] = point_cloud_with_normal
+
+        features.flush()
+        labels.flush()
 
     def get_labels(self):
         return self.__labels
@@ -189,7 +519,7 @@ class ModelNet40Dataset:
         """
         Returns a bytes_list from a string / byte.
         """
-        if isinstance(value, type(tf.constant(0))):
+        if tf.is_tensor(value):
             value = value.numpy() # BytesList won't unpack a string from an EagerTensor.
         return tf.train.Feature(bytes_list=tf.train.BytesList(value=[value]))
 
@@ -200,13 +530,6 @@ class ModelNet40Dataset:
         """
         return tf.train.Feature(float_list=tf.train.FloatList(value=[value]))
 
-    @staticmethod
-    def __floats_feature(value):
-        """
-        Returns a float_list from a numpy.ndarray.
-        """
-        return tf.train.Feature(float_list=tf.train.FloatList(value=value.reshape(-1)))
-
     @staticmethod
     def __int64_feature(value):
         """
@@ -215,32 +538,30 @@ class ModelNet40Dataset:
         return tf.train.Feature(int64_list=tf.train.Int64List(value=[value]))
 
     @staticmethod
-    def serialize(xyz, points, label):
+    def serialize(features, label):
         """ 
         Serialize 
 
         Parameters
         ----------
-        xyz: numpy.ndarray 
-            Point cloud coordinates.
-        points: numpy.ndarray 
-            Point cloud features.
+        features: numpy.ndarray 
+            Point cloud coordinates followed by point cloud features, N-by-(d + C) as parsed by process.
         label: int 
             Shape ID.
 
         """
-        N_p, d = xyz.shape
-        N_f, C = points.shape
+        d = ModelNet40Dataset.d
 
-        assert N_p == N_f, '[ModelNet40 Dataset (With Normal)] ERROR--Dimensions mismatch: xyz & points.'
+        # quantize to int16--xyz by its max magnitude, normals are already in [-1, 1]:
+        scale = float(np.max(np.abs(features[:, :d]))) or 1.0
+        quantized = np.empty(features.shape, dtype='<i2')
+        quantized[:, :d] = np.round(features[:, :d] * (ModelNet40Dataset.Q / scale))
+        quantized[:, d:] = np.round(np.clip(features[:, d:], -1.0, 1.0) * ModelNet40Dataset.Q)
 
         feature = {
-            'xyz': ModelNet40Dataset.__floats_feature(xyz),
-            'points': ModelNet40Dataset.__floats_feature(points),
-            'label': ModelNet40Dataset.__int64_feature(label),
-            'N': ModelNet40Dataset.__int64_feature(N_p),
-            'd': ModelNet40Dataset.__int64_feature(d),
-            'C': ModelNet40Dataset.__int64_feature(C)
+            'features': ModelNet40Dataset.__bytes_feature(quantized.tobytes()),
+            'scale': ModelNet40Dataset.__float_feature(scale),
+            'label': ModelNet40Dataset.__int64_feature(label)
         }
 
         example = tf.train.Example(
@@ -249,6 +570,25 @@ class ModelNet40Dataset:
         
         return example.SerializeToString()
 
+    @staticmethod
+    def read_memmap(filename_memmap):
+        """ 
+        Open split written by write_memmap, read-only
+
+        Parameters
+        ----------
+        filename_memmap: str
+            Filename prefix of .dat / .lbl files
+
+        """
+        labels = np.memmap(f'{filename_memmap}.lbl', dtype=np.int64, mode='r')
+        features = np.memmap(
+            f'{filename_memmap}.dat', dtype=np.float32, mode='r', 
+            shape=(len(labels), ModelNet40Dataset.N, ModelNet40Dataset.d + ModelNet40Dataset.C)
+        )
+
+        return features, labels
+
     @staticmethod
     def deserialize(serialized_example):
         """ 
@@ -261,26 +601,29 @@ class ModelNet40Dataset:
 
         """
         feature_description = {
-            'xyz': tf.io.FixedLenFeature(
-                [ModelNet40Dataset.N * ModelNet40Dataset.d], 
-                tf.float32
-            ),
-            'points': tf.io.FixedLenFeature(
-                [ModelNet40Dataset.N * ModelNet40Dataset.C], 
-                tf.float32
-            ),
+            'features': tf.io.FixedLenFeature([], tf.string),
+            'scale': tf.io.FixedLenFeature([1], tf.float32),
             'label': tf.io.FixedLenFeature([1], tf.int64),
-            'N': tf.io.FixedLenFeature([1], tf.int64),
-            'd': tf.io.FixedLenFeature([1], tf.int64),
-            'C': tf.io.FixedLenFeature([1], tf.int64),
         }
 
         example = tf.io.parse_single_example(
             serialized_example, 
             feature_description
         )
+
+        # decode raw int16 payload:
+        features = tf.io.decode_raw(example['features'], tf.int16, little_endian=True)
+        features = tf.reshape(features, (ModelNet40Dataset.N, ModelNet40Dataset.d + ModelNet40Dataset.C))
+        # dequantize--xyz by its stored scale, normals by full scale:
+        scale = tf.concat(
+            [tf.tile(example['scale'], [ModelNet40Dataset.d]), tf.ones([ModelNet40Dataset.C])], 
+            axis=0
+        ) / ModelNet40Dataset.Q
         
-        return example 
+        return {
+            'features': tf.cast(features, tf.float32) * scale,
+            'label': example['label']
+        }
         
     @staticmethod
     def preprocess(example):
@@ -292,34 +635,28 @@ class ModelNet40Dataset:
         serialized_example: str
             TFRecird serialized example
 
+        Apply with dataset.map(ModelNet40Dataset.preprocess, num_parallel_calls=tf.data.experimental.AUTOTUNE)
+        so examples are preprocessed in parallel.
+
         """
-        xyz = example['xyz']
-        points = example['points']
+        features = example['features']
         label = example['label']
-        N = example['N']
-        d = example['d']
-        C = example['C']
         
         # format:
-        xyz = tf.reshape(xyz, (ModelNet40Dataset.N, ModelNet40Dataset.d))
-        points = tf.reshape(points, (ModelNet40Dataset.N, ModelNet40Dataset.C))
+        xyz = features[:, :ModelNet40Dataset.d]
+        points = features[:, ModelNet40Dataset.d:]
 
         # center to zero:
-        xyz -= tf.reduce_mean(xyz, axis=0)
-
-        # remove order in point cloud:
-        indices = tf.range(start=0, limit=ModelNet40Dataset.N, dtype=tf.int32)
-        shuffled_indices = tf.random.shuffle(indices)
+        xyz = tf.math.subtract(xyz, tf.reduce_mean(xyz, axis=0, keepdims=True))
 
-        # use surface normals:
-        features = tf.gather(
-            tf.concat([xyz, points], 1), 
-            shuffled_indices
+        # use surface normals & remove order in point cloud. shuffles along axis 0 without an explicit gather:
+        features = tf.random.shuffle(
+            tf.concat([xyz, points], 1)
         )
 
         return features, label
 
-    def write(self, output_name):
+    def write(self, output_name, num_shards=8, compression_type='GZIP', num_workers=None, cache=True):
         """ 
         Serialize 
 
@@ -327,24 +664,80 @@ class ModelNet40Dataset:
         ----------
         output_name: str
             Output TFRecord name
+        num_shards: int
+            Number of TFRecord shards per split. Defaults to 8.
+        compression_type: str
+            TFRecord compression, one of '', 'ZLIB' or 'GZIP'. Defaults to 'GZIP'.
+        num_workers: int
+            Number of worker processes. Defaults to CPU count.
+        cache: bool
+            Cache parsed point clouds as .npy next to the input TXT. Defaults to True.
 
         """
+        assert num_shards >= 1, '[ModelNet40 Dataset (With Normal)] ERROR--num_shards must be at least 1.'
+
+        # tf.train.Example serialization is 20-50x slower on the pure-Python protobuf backend:
+        if api_implementation.Type() != 'cpp':
+            print(
+                '[ModelNet40 Dataset (With Normal)]: WARNING--protobuf is using its pure-Python backend, '
+                'unset PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION or install the C++ backend for faster serialization.'
+            )
+
         print('[ModelNet40 Dataset (With Normal)]: Write training set...')        
         self.__write(
-            self.__fit, 
-            os.path.join('data', f'{output_name}_train.tfrecord')
+            self.__fit, self.__fit_label_ids,
+            os.path.join('data', f'{output_name}_train'),
+            num_shards, compression_type, num_workers, cache
         )
 
         print('[ModelNet40 Dataset (With Normal)]: Write validation set...')  
         self.__write(
-            self.__validate, 
-            os.path.join('data', f'{output_name}_validate.tfrecord')
+            self.__validate, self.__validate_label_ids,
+            os.path.join('data', f'{output_name}_validate'),
+            num_shards, compression_type, num_workers, cache
         )
 
         print('[ModelNet40 Dataset (With Normal)]: Write testing set...')  
         self.__write(
-            self.__test, 
-            os.path.join('data', f'{output_name}_test.tfrecord')
+            self.__test, self.__test_label_ids,
+            os.path.join('data', f'{output_name}_test'),
+            num_shards, compression_type, num_workers, cache
+        )
+
+    def write_memmap(self, output_name, num_workers=None, cache=True):
+        """ 
+        Serialize as dense float32 arrays, one .dat (features) & .lbl (labels) pair per split. 
+        Skips TFRecord entirely--read back with read_memmap
+
+        Parameters
+        ----------
+        output_name: str
+            Output name
+        num_workers: int
+            Number of worker processes. Defaults to CPU count.
+        cache: bool
+            Cache parsed point clouds as .npy next to the input TXT. Defaults to True.
+
+        """
+        print('[ModelNet40 Dataset (With Normal)]: Write training set...')        
+        self.__write_memmap(
+            self.__fit, self.__fit_label_ids,
+            os.path.join('data', f'{output_name}_train'),
+            num_workers, cache
+        )
+
+        print('[ModelNet40 Dataset (With Normal)]: Write validation set...')  
+        self.__write_memmap(
+            self.__validate, self.__validate_label_ids,
+            os.path.join('data', f'{output_name}_validate'),
+            num_workers, cache
+        )
+
+        print('[ModelNet40 Dataset (With Normal)]: Write testing set...')  
+        self.__write_memmap(
+            self.__test, self.__test_label_ids,
+            os.path.join('data', f'{output_name}_test'),
+            num_workers, cache
         )
 
 def get_arguments():
@@ -357,6 +750,7 @@ def get_arguments():
 
     # add required and optional groups:
     required = parser.add_argument_group('Required')
+    optional = parser.add_argument_group('Optional')
 
     # add required:
     required.add_argument(
@@ -367,6 +761,27 @@ def get_arguments():
         "-o", dest="output", help="Output TFRecord name.",
         required=True, type=str
     )
+    # add optional:
+    optional.add_argument(
+        "-f", dest="format", help="Output format, TFRecord shards or dense memmap arrays. Defaults to tfrecord.",
+        required=False, type=str, default='tfrecord', choices=['tfrecord', 'memmap']
+    )
+    optional.add_argument(
+        "-s", dest="num_shards", help="Number of TFRecord shards per split. Defaults to 8.",
+        required=False, type=int, default=8
+    )
+    optional.add_argument(
+        "-c", dest="compression_type", help="TFRecord compression. Defaults to GZIP.",
+        required=False, type=str, default='GZIP', choices=['', 'ZLIB', 'GZIP']
+    )
+    optional.add_argument(
+        "-n", dest="num_workers", help="Number of worker processes. Defaults to CPU count.",
+        required=False, type=int, default=None
+    )
+    optional.add_argument(
+        "--no-cache", dest="cache", help="Do not write .npy caches of parsed point clouds into the input directory.",
+        required=False, action='store_false'
+    )
 
     # parse arguments:
     return parser.parse_args()
@@ -381,7 +796,14 @@ if __name__ == "__main__":
         args.input
     )
 
-    # convert into TFRecord
-    modelnet40_dataset.write(
-        args.output
-    )
\ No newline at end of file
+    # convert into TFRecord / memmap:
+    if args.format == 'memmap':
+        modelnet40_dataset.write_memmap(
+            args.output,
+            args.num_workers, args.cache
+        )
+    else:
+        modelnet40_dataset.write(
+            args.output,
+            args.num_shards, args.compression_type, args.num_workers, args.cache
+        )
\ No newline at end of file
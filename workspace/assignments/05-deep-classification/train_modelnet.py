@@ -24,28 +24,91 @@ import matplotlib.pyplot as plt
 
 tf.random.set_seed(1234)
 
-def load_dataset(input_filename, batch_size):
+def load_dataset(input_filename, batch_size, compression_type='GZIP'):
 	""" 
 	Load dataset
 
 	Parameters
 	----------
 	input_filename: str 
-		Filename of dataset as TFRecord.
+		Filename pattern of dataset TFRecord shards.
 	batch_size: int 
 		Mini-batch size.
+	compression_type: str 
+		TFRecord compression, one of '', 'ZLIB' or 'GZIP'. Defaults to 'GZIP'.
 
 	"""
-	assert os.path.isfile(input_filename), '[ModelNet40 Train] ERROR--dataset path not found'
+	filenames = tf.io.gfile.glob(input_filename)
 
-	dataset = tf.data.TFRecordDataset(input_filename)
+	assert len(filenames) > 0, '[ModelNet40 Train] ERROR--dataset path not found'
+
+	# read shards in parallel:
+	dataset = tf.data.Dataset.from_tensor_slices(filenames)
+	dataset = dataset.shuffle(len(filenames))
+	dataset = dataset.interleave(
+		lambda filename: tf.data.TFRecordDataset(filename, compression_type=compression_type), 
+		cycle_length=len(filenames), 
+		num_parallel_calls=tf.data.experimental.AUTOTUNE
+	)
 	dataset = dataset.shuffle(
 		buffer_size=1024, 
 		reshuffle_each_iteration=True
 	)
-	dataset = dataset.map(ModelNet40Dataset.deserialize)
-	dataset = dataset.map(ModelNet40Dataset.preprocess)
+	dataset = dataset.map(
+		ModelNet40Dataset.deserialize, 
+		num_parallel_calls=tf.data.experimental.AUTOTUNE
+	)
+	dataset = dataset.map(
+		ModelNet40Dataset.preprocess, 
+		num_parallel_calls=tf.data.experimental.AUTOTUNE
+	)
+	dataset = dataset.batch(batch_size, drop_remainder=True)
+	dataset = dataset.prefetch(tf.data.experimental.AUTOTUNE)
+
+	return dataset
+
+
+def load_memmap_dataset(input_name, batch_size):
+	""" 
+	Load dataset written by ModelNet40Dataset.write_memmap
+
+	Parameters
+	----------
+	input_name: str 
+		Filename prefix of dataset .dat / .lbl files.
+	batch_size: int 
+		Mini-batch size.
+
+	"""
+	assert os.path.isfile(f'{input_name}.dat'), '[ModelNet40 Train] ERROR--dataset path not found'
+
+	features, labels = ModelNet40Dataset.read_memmap(input_name)
+
+	def get_example(index):
+		return features[index], labels[index:index + 1]
+
+	# shuffle indices over the whole split, the page cache serves the random reads:
+	dataset = tf.data.Dataset.range(len(labels))
+	dataset = dataset.shuffle(
+		buffer_size=len(labels), 
+		reshuffle_each_iteration=True
+	)
+	dataset = dataset.map(
+		lambda index: tf.numpy_function(get_example, [index], (tf.float32, tf.int64)), 
+		num_parallel_calls=tf.data.experimental.AUTOTUNE
+	)
+	dataset = dataset.map(
+		lambda X, y: {
+			'features': tf.ensure_shape(X, (ModelNet40Dataset.N, ModelNet40Dataset.d + ModelNet40Dataset.C)), 
+			'label': tf.ensure_shape(y, (1, ))
+		}
+	)
+	dataset = dataset.map(
+		ModelNet40Dataset.preprocess, 
+		num_parallel_calls=tf.data.experimental.AUTOTUNE
+	)
 	dataset = dataset.batch(batch_size, drop_remainder=True)
+	dataset = dataset.prefetch(tf.data.experimental.AUTOTUNE)
 
 	return dataset
 
@@ -62,8 +125,13 @@ def train(config):
 	"""
 
 	# load dataset:
-	training_data = load_dataset(config['training_data'], config['batch_size'])
-	validation_data = load_dataset(config['validation_data'], config['batch_size'])
+	if config.get('memmap', False):
+		training_data = load_memmap_dataset(config['training_data'], config['batch_size'])
+		validation_data = load_memmap_dataset(config['validation_data'], config['batch_size'])
+	else:
+		compression_type = config.get('compression_type', 'GZIP')
+		training_data = load_dataset(config['training_data'], config['batch_size'], compression_type)
+		validation_data = load_dataset(config['validation_data'], config['batch_size'], compression_type)
 
 	# init model:
 	if config['msg'] == True:
@@ -111,7 +179,10 @@ def predict(config):
 
 	"""
 	# load dataset:
-	data = load_dataset(config['test_data'], config['batch_size'])
+	if config.get('memmap', False):
+		data = load_memmap_dataset(config['test_data'], config['batch_size'])
+	else:
+		data = load_dataset(config['test_data'], config['batch_size'], config.get('compression_type', 'GZIP'))
 
 	# init model:
 	if config['msg'] == True:
@@ -149,21 +220,24 @@ def predict(config):
 
 if __name__ == '__main__':
 	# config = {
-	# 	'training_data' : 'data/modelnet40_with_normal_train.tfrecord',
-	# 	'validation_data' : 'data/modelnet40_with_normal_validate.tfrecord',
-	# 	'test_data' : 'data/modelnet40_with_normal_test.tfrecord',
+	# 	'training_data' : 'data/modelnet40_with_normal_train-*.tfrecord',
+	# 	'validation_data' : 'data/modelnet40_with_normal_validate-*.tfrecord',
+	# 	'test_data' : 'data/modelnet40_with_normal_test-*.tfrecord',
 	# 	'log_dir' : 'msg_1',
 	# 	'batch_size' : 16,
 	# 	'lr' : 0.001,
 	# 	'num_classes' : 40,
 	# 	'msg' : True,
-	# 	'batch_normalization' : False
+	# 	'batch_normalization' : False,
+	# 	'compression_type' : 'GZIP'
 	# }
+	# to train from preprocess.py -f memmap output, point the *_data keys to 
+	# the name prefix, e.g. 'data/modelnet40_with_normal_train', and set 'memmap' : True
 
 	# train(config)
 
 	config = {
-		'test_data' : 'data/modelnet40_with_normal_test.tfrecord',
+		'test_data' : 'data/modelnet40_with_normal_test-*.tfrecord',
 		'msg' : True,
 		'batch_size' : 16,
 		'num_classes' : 40,